@@ -1,9 +1,17 @@
 import streamlit as st
-import pandas_datareader.data as web
 import pandas as pd
+import numpy as np
 import datetime as dt
 import plotly.express as px
+import plotly.graph_objects as go
+import yfinance as yf
 import os
+import tempfile
+import asyncio
+import httpx
+import orjson
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 
 # === Konfigurasi Dasar ===
 st.set_page_config(page_title="Ultimate Global Macro Dashboard", layout="wide")
@@ -17,73 +25,218 @@ if not FRED_API_KEY:
     st.stop()
 
 # === Tentukan rentang waktu ===
-start = dt.datetime(2015, 1, 1)
-end = dt.datetime.now()
+# String tetap (bukan datetime.now()) supaya cache key st.cache_data stabil antar rerun
+START_DATE = dt.date(2015, 1, 1).isoformat()
+
+# === Ambil data dari FRED (paralel) ===
+# Seri inti Level 1 beserta nama tampilannya; M2SL dipakai di Level 3
+RENAME_MAP = {"FEDFUNDS": "Fed Funds Rate", "CPILFESL": "Core CPI", "PAYEMS": "Nonfarm Payrolls", "GDP": "US GDP"}
+FRED_SERIES = [*RENAME_MAP, "M2SL"]
+FRED_URL = "https://api.stlouisfed.org/fred/series/observations"
+FRED_CACHE_DIR = os.path.join(".cache", "fred")
+# HTTP/2: semua request seri FRED dimultipleks di atas satu koneksi TCP+TLS
+FRED_LIMITS = httpx.Limits(max_keepalive_connections=16, max_connections=32)
+FRED_TIMEOUT = httpx.Timeout(15.0)
+
+async def _fred_df_async(client, sem, sid, start_date, api_key):
+    params = {"series_id": sid, "api_key": api_key, "file_type": "json"}
+    if start_date:
+        params["observation_start"] = start_date
+    async with sem:
+        r = await client.get(FRED_URL, params=params)
+    r.raise_for_status()
+    obs = orjson.loads(r.content)["observations"]
+    # Bangun array langsung dari JSON, tanpa DataFrame perantara per baris
+    dates = np.fromiter((o["date"] for o in obs), dtype="datetime64[D]", count=len(obs))
+    # errors="coerce": "." (data kosong) atau nilai non-angka lain jadi NaN, bukan menggagalkan seri
+    vals = pd.to_numeric(np.fromiter((o["value"] for o in obs), dtype=object, count=len(obs)),
+                         errors="coerce").astype(float)
+    return pd.DataFrame({sid: vals}, index=pd.DatetimeIndex(dates, name="date"))
 
-# === Ambil data dari FRED ===
-def get_fred_data(series_id, name):
+def _write_fred_cache(df, path):
+    # Tulis ke file sementara lalu os.replace (atomik), supaya sesi lain tidak membaca file setengah jadi
+    os.makedirs(FRED_CACHE_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=FRED_CACHE_DIR, suffix=".parquet.tmp")
+    os.close(fd)
     try:
-        data = web.DataReader(series_id, "fred", start, end, api_key=FRED_API_KEY)
-        data = data.dropna()
-        data.columns = [name]
-        return data
-    except Exception as e:
-        st.error(f"Gagal ambil data {name}: {e}")
-        return pd.DataFrame()
-
-# === Dataset utama ===
-fedfunds = get_fred_data("FEDFUNDS", "Fed Funds Rate")
-core_cpi = get_fred_data("CPILFESL", "Core CPI")
-payems = get_fred_data("PAYEMS", "Nonfarm Payrolls")
-gdp = get_fred_data("GDP", "US GDP")
-
-# === Gabungkan semua data ===
-data_dict = {"Fed Funds": fedfunds, "Core CPI": core_cpi, "Payrolls": payems, "GDP": gdp}
-combined_data = pd.concat(data_dict.values(), axis=1)
-
-if combined_data.empty:
-    st.warning("Tidak ada data yang berhasil dimuat.")
-else:
-    # === Buat 4 kolom metrik ===
-    col1, col2, col3, col4 = st.columns(4)
-    col1.metric("Fed Funds Rate", f"{fedfunds.iloc[-1,0]:.2f}%")
-    col2.metric("Core CPI (YoY)", f"{core_cpi.iloc[-1,0]:.2f}")
-    col3.metric("Nonfarm Payrolls (k)", f"{payems.iloc[-1,0]/1000:.1f}M")
-    col4.metric("GDP (Trillion USD)", f"{gdp.iloc[-1,0]/1000:.1f}")
-
-    st.markdown("---")
-    st.subheader("📈 Visualisasi Data Ekonomi Utama")
+        df.to_parquet(tmp_path, compression="zstd")
+        os.replace(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+async def cached_fred_df(client, sem, sid, start_date, api_key):
+    """Baca seri dari cache Parquet di disk, lalu ambil hanya observasi baru dari FRED."""
+    path = os.path.join(FRED_CACHE_DIR, f"{sid}.parquet")
+    # I/O disk lewat thread supaya tidak menahan request seri lain di gather
+    cached = await asyncio.to_thread(pd.read_parquet, path) if os.path.exists(path) else None
+    has_cache = cached is not None and not cached.empty
+    try:
+        if not has_cache:
+            # Cache kosong: ambil seluruh histori sekali supaya cache tidak tergantung start_date
+            df = await _fred_df_async(client, sem, sid, None, api_key)
+        else:
+            # Ambil ulang observasi terakhir juga, karena angka awal FRED sering direvisi
+            delta = await _fred_df_async(client, sem, sid, cached.index.max().strftime("%Y-%m-%d"), api_key)
+            df = pd.concat([cached, delta])
+            df = df[~df.index.duplicated(keep="last")]
+    except Exception:
+        if not has_cache:
+            raise
+        # FRED gagal: tetap tampilkan histori dari disk daripada mengosongkan seri
+        return cached[cached.index >= start_date]
+    if not df.equals(cached):
+        await asyncio.to_thread(_write_fred_cache, df, path)
+    return df[df.index >= start_date]
+
+async def _fetch_all_fred_async(series_specs, api_key):
+    sem = asyncio.Semaphore(8)  # jaga di bawah rate limit FRED
+    # Satu client = satu pool koneksi keep-alive untuk semua seri; retry otomatis jika koneksi gagal
+    transport = httpx.AsyncHTTPTransport(http2=True, retries=3, limits=FRED_LIMITS)
+    async with httpx.AsyncClient(timeout=FRED_TIMEOUT, transport=transport) as client:
+        tasks = [cached_fred_df(client, sem, sid, s, api_key) for sid, s in series_specs.items()]
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+class FredFetchError(Exception):
+    """Sebagian seri FRED gagal; membawa hasil parsial supaya batch tidak ikut di-cache."""
+
+    def __init__(self, data, errors):
+        super().__init__("; ".join(errors))
+        self.data = data
+        self.errors = errors
+
+@st.cache_data(ttl=3600)
+def fetch_all_fred(series_specs, api_key):
+    """Ambil semua seri FRED dalam satu batch; hasil berupa satu DataFrame lebar (kolom = series_id).
+
+    `series_specs` adalah dict {series_id: "YYYY-MM-DD"} sehingga cache key stabil antar rerun.
+    Jika ada seri yang gagal, raise FredFetchError: st.cache_data tidak menyimpan exception,
+    jadi rerun berikutnya langsung mencoba lagi alih-alih menampilkan data kosong selama 1 jam.
+    """
+    results = asyncio.run(_fetch_all_fred_async(series_specs, api_key))
+    frames, errors = [], []
+    for sid, res in zip(series_specs, results):
+        if isinstance(res, Exception):
+            # Pesan error httpx memuat URL lengkap, jangan tampilkan API key ke pengguna
+            errors.append(f"Gagal ambil data {sid}: {str(res).replace(api_key, '***')}")
+            # Index tanggal kosong, sama seperti hasil asli, supaya perbandingan tanggal hilir tetap jalan
+            res = pd.DataFrame(columns=[sid], dtype=float, index=pd.DatetimeIndex([], name="date"))
+        frames.append(res)
+    data = pd.concat(frames, axis=1).sort_index()
+    if errors:
+        raise FredFetchError(data, errors)
+    return data
+
+def load_fred(series_specs, api_key):
+    """Wrapper tanpa cache: kembalikan (DataFrame, daftar pesan error)."""
+    try:
+        return fetch_all_fred(series_specs, api_key), []
+    except FredFetchError as e:
+        return e.data, e.errors
+
+# === Ambil data pasar dari Yahoo Finance (satu request untuk semua ticker) ===
+ALL_TICKERS = ["^GSPC", "DX-Y.NYB", "^VIX"]
+
+class PriceFetchError(Exception):
+    """Yahoo Finance tidak mengembalikan data (rate limit / jaringan gagal)."""
+
+@st.cache_data(ttl=900)
+def load_prices():
+    prices = yf.download(" ".join(ALL_TICKERS), period="6mo", interval="1d",
+                         group_by="ticker", threads=True, progress=False)
+    if prices.empty:
+        # Raise supaya frame kosong tidak ikut di-cache 15 menit; rerun berikutnya mencoba lagi
+        raise PriceFetchError("Gagal ambil data Yahoo Finance (S&P 500, DXY, VIX).")
+    return prices
+
+# === Kerangka layout dulu (placeholder), supaya UI langsung tampil sebelum data selesai diambil ===
+err_ph = st.empty()  # pesan gagal fetch tampil di bawah judul, dekat metrik yang terdampak
+metric_phs = [col.empty() for col in st.columns(4)]
+st.markdown("---")
+st.subheader("📈 Visualisasi Data Ekonomi Utama")
+core_chart_ph = st.empty()
+
+st.header("Level 2 — Cross Market Analysis")
+cross_chart_ph = st.empty()
+
+st.header("Level 3 — Liquidity & Positioning")
+liquidity_chart_ph = st.empty()
+
+def render_core_macro(fred):
+    combined_data = fred[list(RENAME_MAP)].dropna(how="all").rename(columns=RENAME_MAP)
+    if combined_data.empty:
+        core_chart_ph.warning("Tidak ada data yang berhasil dimuat.")
+        return
+
+    # === Isi 4 kolom metrik ===
+    latest = fred.ffill().iloc[-1]  # nilai terakhir tiap seri, dihitung sekali untuk semua metrik
+    metric_phs[0].metric("Fed Funds Rate", f"{latest['FEDFUNDS']:.2f}%")
+    metric_phs[1].metric("Core CPI (YoY)", f"{latest['CPILFESL']:.2f}")
+    metric_phs[2].metric("Nonfarm Payrolls (k)", f"{latest['PAYEMS']/1000:.1f}M")
+    metric_phs[3].metric("GDP (Trillion USD)", f"{latest['GDP']/1000:.1f}")
 
     # === Grafik interaktif dengan Plotly ===
     fig = px.line(combined_data, x=combined_data.index, y=combined_data.columns,
                   title="Core Macro Overview", markers=True)
-    st.plotly_chart(fig, use_container_width=True)
-import yfinance as yf
-import plotly.graph_objects as go
+    core_chart_ph.plotly_chart(fig, use_container_width=True)
 
-st.header("Level 2 — Cross Market Analysis")
-# Ambil data S&P500 dan DXY (Dollar Index)
-sp500 = yf.download("^GSPC", period="6mo")
-dxy = yf.download("DX-Y.NYB", period="6mo")
+def render_cross_market(closes):
+    # Data S&P500 dan DXY (Dollar Index)
+    sp500 = closes["^GSPC"].dropna()
+    dxy = closes["DX-Y.NYB"].dropna()
 
-fig = go.Figure()
-fig.add_trace(go.Scatter(x=sp500.index, y=sp500['Close'], name='S&P 500'))
-fig.add_trace(go.Scatter(x=dxy.index, y=dxy['Close'], name='US Dollar Index'))
-fig.update_layout(title="S&P 500 vs Dollar Index (Risk On / Risk Off)")
-st.plotly_chart(fig)
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=sp500.index, y=sp500, name='S&P 500'))
+    fig.add_trace(go.Scatter(x=dxy.index, y=dxy, name='US Dollar Index'))
+    fig.update_layout(title="S&P 500 vs Dollar Index (Risk On / Risk Off)")
+    cross_chart_ph.plotly_chart(fig)
 
-st.header("Level 3 — Liquidity & Positioning")
-# Ambil data VIX dan M2 Money Supply
-vix = yf.download("^VIX", period="6mo")
-m2 = pdr.get_data_fred("M2SL")
-
-fig2 = go.Figure()
-fig2.add_trace(go.Scatter(x=vix.index, y=vix['Close'], name='VIX Volatility Index'))
-fig2.add_trace(go.Scatter(x=m2.index, y=m2['M2SL'], name='Money Supply (M2)', yaxis='y2'))
-
-fig2.update_layout(
-    title="Volatility (VIX) vs Money Supply (M2)",
-    yaxis=dict(title="VIX"),
-    yaxis2=dict(title="M2", overlaying='y', side='right')
-)
-st.plotly_chart(fig2)
+def render_liquidity(closes, fred):
+    # Data VIX dan M2 Money Supply
+    vix = closes["^VIX"].dropna()
+    m2 = fred["M2SL"].dropna()
+    # Potong M2 ke jendela VIX (6 bulan) supaya Plotly tidak mengirim 10 tahun data yang toh tidak sejajar
+    m2 = m2[m2.index >= vix.index.min() - pd.DateOffset(months=1)]
+
+    fig2 = go.Figure()
+    fig2.add_trace(go.Scatter(x=vix.index, y=vix, name='VIX Volatility Index'))
+    fig2.add_trace(go.Scatter(x=m2.index, y=m2, name='Money Supply (M2)', yaxis='y2'))
+
+    fig2.update_layout(
+        title="Volatility (VIX) vs Money Supply (M2)",
+        yaxis=dict(title="VIX"),
+        yaxis2=dict(title="M2", overlaying='y', side='right')
+    )
+    liquidity_chart_ph.plotly_chart(fig2)
+
+# === Jalankan semua fetch (FRED + Yahoo) secara paralel, render tiap bagian begitu datanya siap ===
+fetch_tasks = {
+    "fred": (load_fred,
+             {sid: START_DATE for sid in FRED_SERIES},
+             FRED_API_KEY),
+    "prices": (load_prices,),
+}
+results = {}
+# Thread worker butuh ScriptRunContext supaya st.cache_data tetap jalan
+ctx = get_script_run_ctx()
+with ThreadPoolExecutor(max_workers=len(fetch_tasks), initializer=add_script_run_ctx, initargs=(None, ctx)) as ex:
+    futures = {ex.submit(fn, *args): name for name, (fn, *args) in fetch_tasks.items()}
+    for f in as_completed(futures):
+        name = futures[f]
+        if name == "fred":
+            results["fred"], fred_errors = f.result()
+            if fred_errors:
+                err_ph.error("\n\n".join(fred_errors))
+            render_core_macro(results["fred"])
+        else:
+            try:
+                prices = f.result()
+            except PriceFetchError as e:
+                cross_chart_ph.error(str(e))
+                liquidity_chart_ph.error(str(e))
+            else:
+                # Ambil kolom Close semua ticker sekali, lalu tiap grafik cukup slice di memori
+                results["closes"] = prices.xs("Close", axis=1, level=1)
+                render_cross_market(results["closes"])
+        if "fred" in results and "closes" in results:
+            render_liquidity(results["closes"], results["fred"])